@@ -1,11 +1,58 @@
+import atexit
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
 from flask import Flask
 from config import Config
 
+_log_listener = None
+
+def configure_logging(level=logging.INFO):
+    """
+    Send the service's log records to stdout from a background thread.
+
+    Request threads only put records on a queue, so logging never blocks
+    them on a write to stdout.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    _log_listener = QueueListener(log_queue, stream_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+    logger = logging.getLogger(__name__)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(level)
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    configure_logging()
+
     from app.routes import blueprint as api_blueprint
     app.register_blueprint(api_blueprint, url_prefix='/api')
 
+    if app.config['REAP_ORPHANED_POOLS']:
+        from app.services.code_executor import reap_orphaned_pools
+        threading.Thread(target=reap_orphaned_pools, daemon=True).start()
+
+    if app.config['WARM_UP_IMAGES']:
+        from app.services.code_executor import LANGUAGE_CONFIGS, warm_up_images
+        # Warm up the images the executor actually runs, once each
+        images = list(dict.fromkeys(config['image'] for config in LANGUAGE_CONFIGS.values()))
+        threading.Thread(
+            target=warm_up_images,
+            args=(images,),
+            daemon=True
+        ).start()
+
     return app
\ No newline at end of file
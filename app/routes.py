@@ -1,21 +1,61 @@
-from flask import Blueprint, request, jsonify
-from app.services.code_executor import CodeExecutor
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import orjson
+from flask import Blueprint, Response, current_app, request
+from app.services.code_executor import CodeExecutor, CompilationError, ExecutionError
 from app.exceptions.judge_exceptions import UnsupportedLanguageError
-from app.services.judge_service import get_problem, get_test_cases
+from app.services.judge_service import get_problem, get_test_cases, invalidate_problem
 
 blueprint = Blueprint('api', __name__)
 
+def json_response(payload, status=200):
+    """Build a JSON response, serialized with orjson."""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+def judge_test_case(executor, test_input, expected):
+    """
+    Run one test case and decide its status.
+
+    Called from the worker threads so the comparison overlaps with other
+    runs. The expected output must already be stripped and encoded.
+    """
+    result = executor.run(test_input)
+
+    if result['status'] == 'skipped':
+        status = 'SKIPPED'
+    elif result['status'] == 'timeout':
+        status = 'TIME_LIMIT_EXCEEDED'
+    elif result['status'] == 'memory_limit':
+        status = 'MEMORY_LIMIT_EXCEEDED'
+    elif result['status'] == 'output_limit':
+        status = 'OUTPUT_LIMIT_EXCEEDED'
+    elif result['exit_code'] != 0:
+        status = 'RUNTIME_ERROR'
+    elif result['output'].strip() != expected:
+        status = 'WRONG_ANSWER'
+    else:
+        status = 'ACCEPTED'
+
+    return result, status
+
 @blueprint.route('/judge', methods=['POST'])
 def judge():
-    data = request.get_json()
+    try:
+        data = orjson.loads(request.get_data())
+    except orjson.JSONDecodeError:
+        return json_response({'error': 'Request body must be valid JSON'}, 400)
     submission_id = data['submissionId']
     problem_id = data['problemId']
     language = data['language']
     source_code = data['sourceCode']
-    # Get problem details and test cases from database
-    problem = get_problem(problem_id)
+    # Get problem details and test cases from database, concurrently
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        problem_future = pool.submit(get_problem, problem_id)
+        test_cases_future = pool.submit(get_test_cases, problem_id)
+    problem = problem_future.result()
     problem = problem['data']
-    test_cases = get_test_cases(problem_id)
+    test_cases = test_cases_future.result()
     test_cases = test_cases['data']
 
     try:
@@ -26,19 +66,61 @@ def judge():
             problem['memoryLimit']
         )
     except UnsupportedLanguageError as e:
-        return jsonify({'error': str(e)}), 400
+        return json_response({'error': str(e)}, 400)
+
+    with executor:
+        try:
+            executor.prepare()
+        except CompilationError as e:
+            return json_response({
+                'submissionId': submission_id,
+                'result': 'COMPILATION_ERROR',
+                'error': str(e),
+                'testResults': []
+            })
+        except ExecutionError as e:
+            return json_response({
+                'submissionId': submission_id,
+                'error': str(e)
+            }, 500)
+
+        # Normalize every expected output once, before any run starts. Both
+        # sides are stripped as bytes, so only ASCII whitespace is trimmed
+        expected_outputs = [test_case['output'].encode('utf-8').strip() for test_case in test_cases]
+
+        # Test cases are independent, so run them concurrently against the
+        # prepared workspace; each run gets its own container, stdin and CPU,
+        # so there is no point in more workers than CPUs.
+        max_workers = max(1, min(len(test_cases), os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(judge_test_case, executor, test_case['input'], expected)
+                for test_case, expected in zip(test_cases, expected_outputs)
+            ]
+
+            # The verdict is decided by the first failing test case, so
+            # optionally stop everything else as soon as one fails
+            if current_app.config['EARLY_EXIT']:
+                for future in as_completed(futures):
+                    _, status = future.result()
+                    if status not in ('ACCEPTED', 'SKIPPED'):
+                        for pending in futures:
+                            pending.cancel()
+                        executor.cancel()
+                        break
 
     results = []
-    for test_case in test_cases:
-        result = executor.execute(test_case['input'])
-        
-        if result['exit_code'] != 0:
-            status = 'RUNTIME_ERROR'
-        elif result['output'].strip() != test_case['output'].strip():
-            status = 'WRONG_ANSWER'
-        else:
-            status = 'ACCEPTED'
+    for test_case, future in zip(test_cases, futures):
+        if future.cancelled():
+            results.append({
+                'testCaseId': test_case['id'],
+                'status': 'SKIPPED',
+                'executionTime': None,
+                'memoryUsed': None
+            })
+            continue
 
+        result, status = future.result()
         results.append({
             'testCaseId': test_case['id'],
             'status': status,
@@ -46,11 +128,20 @@ def judge():
             'memoryUsed': result['memory_used']
         })
 
-    # Calculate final result
-    final_result = 'ACCEPTED' if all(r['status'] == 'ACCEPTED' for r in results) else 'WRONG_ANSWER'
+    # The submission's verdict is the status of the first test case, in test
+    # order, that did not pass; skipped test cases never decide it
+    final_result = next(
+        (r['status'] for r in results if r['status'] not in ('ACCEPTED', 'SKIPPED')),
+        'ACCEPTED'
+    )
 
-    return jsonify({
+    return json_response({
         'submissionId': submission_id,
         'result': final_result,
         'testResults': results
-    })
\ No newline at end of file
+    })
+
+@blueprint.route('/cache/invalidate/<problem_id>', methods=['POST'])
+def invalidate_cache(problem_id):
+    invalidate_problem(problem_id)
+    return json_response({'problemId': problem_id, 'invalidated': True})
\ No newline at end of file
@@ -1,12 +1,144 @@
+import atexit
+import collections
 import docker
+import io
 import os
-import tempfile
+import shlex
+import socket
+import tarfile
+import threading
+import time
+import uuid
 import logging
-from typing import Optional, Dict, Any
 from contextlib import contextmanager
+from typing import Optional, Dict, Any, Union
+from docker.utils.socket import STDOUT, frames_iter
 
 from app.exceptions.judge_exceptions import UnsupportedLanguageError
 
+# Number of idle containers kept warm per pool; as many as programs can run
+# at once, so a submission never starts containers only to remove them
+CONTAINER_POOL_SIZE = os.cpu_count() or 1
+
+# Seconds a pool may go without submissions before it is closed
+POOL_IDLE_TIMEOUT = 300
+
+# Label put on every pool container and volume; its value names the judge
+# process owning them, so the ones left behind by a dead process can be found
+POOL_LABEL = 'judgebox.pool'
+POOL_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+
+# Maximum time in seconds a compiler may run before the build is abandoned
+COMPILE_TIME_LIMIT = 10
+
+# Maximum stdout kept per run; programs writing more are stopped
+MAX_OUTPUT_BYTES = 1024 * 1024
+
+# Unprivileged uids handed out to submissions; each submission compiles and
+# runs as its own uid, which alone can enter its 0700 workspace
+SUBMISSION_UIDS = range(20000, 30000)
+
+# Prints how many processes the cgroup OOM killer has killed in a container
+# (cgroup v2, then cgroup v1)
+OOM_KILLS_CMD = (
+    "sed -n 's/^oom_kill //p'"
+    ' /sys/fs/cgroup/memory.events /sys/fs/cgroup/memory/memory.oom_control 2>/dev/null'
+)
+
+# Kills every process of a pooled container except its PID 1, clears the
+# scratch directories and prints the OOM kill count, then fails if anything
+# had still been running
+RESET_CMD = [
+    'sh', '-c',
+    'kill -9 -1 2>/dev/null;'
+    ' rm -rf /tmp/* /tmp/.[!.]* /dev/shm/* 2>/dev/null;'
+    f' {OOM_KILLS_CMD};'
+    ' ! kill -0 -1 2>/dev/null'
+]
+
+# Directory of every pool volume holding the judge's own helpers; it is
+# owned by root, so submissions can run but not change them
+HELPER_DIR = '/workspace/.judge'
+
+# Precedes the peak memory the measuring wrappers write to stderr
+MAXRSS_MARKER = b'__judge_maxrss__'
+
+# Number of trailing stderr bytes kept per run to find the wrapper's report
+STDERR_TAIL_BYTES = 256
+
+# Measuring wrappers: each one runs the program given as its arguments, waits
+# for it and writes the program's peak resident set size in KB to stderr.
+# getrusage() for the waited child covers that program alone, unlike the
+# container's cgroup counters. The wrapper exits like the program did.
+# posix_spawn() starts the child in the Python wrapper's memory, so its figure
+# never drops below the wrapper's own, which is under an interpreter's anyway.
+MEASURE_PY_SOURCE = r"""import os
+import sys
+
+pid = os.posix_spawnp(sys.argv[1], sys.argv[1:], os.environ)
+_, status, usage = os.wait4(pid, 0)
+os.write(2, b'\n__judge_maxrss__ %d\n' % usage.ru_maxrss)
+code = os.waitstatus_to_exitcode(status)
+os._exit(128 - code if code < 0 else code)
+"""
+
+MEASURE_C_SOURCE = r"""#include <stdio.h>
+#include <sys/resource.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+int main(int argc, char **argv)
+{
+    struct rusage usage;
+    int status;
+    pid_t pid;
+
+    if (argc < 2)
+        return 2;
+
+    pid = fork();
+    if (pid == 0) {
+        execvp(argv[1], argv + 1);
+        _exit(127);
+    }
+    if (pid < 0 || wait4(pid, &status, 0, &usage) < 0)
+        return 126;
+
+    fprintf(stderr, "\n__judge_maxrss__ %ld\n", usage.ru_maxrss);
+    if (WIFSIGNALED(status))
+        return 128 + WTERMSIG(status);
+    return WEXITSTATUS(status);
+}
+"""
+
+LANGUAGE_CONFIGS = {
+    'python': {
+        'image': 'python:3.9-slim',
+        'extension': '.py',
+        'compile_cmd': None,
+        'run_cmd': 'python {filename}',
+        'measure': {
+            'file': 'measure.py',
+            'source': MEASURE_PY_SOURCE,
+            'build_cmd': None,
+            'cmd': f'python -S {HELPER_DIR}/measure.py'
+        }
+    },
+    'cpp': {
+        'image': 'gcc:latest',
+        'extension': '.cpp',
+        'compile_cmd': 'g++ {filename} -o program',
+        'run_cmd': './program',
+        'measure': {
+            'file': 'measure.c',
+            'source': MEASURE_C_SOURCE,
+            'build_cmd': 'gcc -O2 -o measure measure.c',
+            'cmd': f'{HELPER_DIR}/measure'
+        }
+    }
+}
+
 class ExecutionError(Exception):
     """Base exception for code execution errors"""
     pass
@@ -23,6 +155,449 @@ class ExecutionTimeoutError(ExecutionError):
     """Raised when code execution exceeds time limit"""
     pass
 
+class OutputLimitExceededError(ExecutionError):
+    """Raised when a program writes more than MAX_OUTPUT_BYTES to stdout"""
+    pass
+
+class ExecutionCancelledError(ExecutionError):
+    """Raised when a run is stopped by CodeExecutor.cancel()"""
+    pass
+
+_docker_client = None
+_docker_client_lock = threading.Lock()
+
+def _connect_docker() -> docker.DockerClient:
+    """Connect to the Docker daemon with error handling."""
+    logger = logging.getLogger(__name__)
+    try:
+        # Try to initialize Docker client without specifying a URL
+        docker_client = docker.from_env()
+        
+        # Test the connection
+        docker_client.ping()
+        logger.info("Successfully connected to Docker daemon")
+        return docker_client
+    
+    except docker.errors.DockerException as e:
+        logger.error(f"Failed to connect to Docker daemon: {str(e)}")
+        
+        # Try to initialize Docker client with a specific URL
+        try:
+            docker_client = docker.DockerClient(base_url="unix://var/run/docker.sock")
+            docker_client.ping()
+            logger.info("Successfully connected to Docker daemon using Unix socket")
+            return docker_client
+        except docker.errors.DockerException as e:
+            raise DockerConnectionError(f"Failed to connect to Docker daemon: {str(e)}")
+
+def get_docker_client() -> docker.DockerClient:
+    """
+    Return the process-wide Docker client, connecting on first use.
+
+    The client keeps a pool of connections to the daemon and is shared by
+    all executors, so it must not be closed by them.
+    """
+    global _docker_client
+    with _docker_client_lock:
+        if _docker_client is None:
+            _docker_client = _connect_docker()
+        return _docker_client
+
+_free_uids = collections.deque(SUBMISSION_UIDS)
+_uids_lock = threading.Lock()
+
+def _acquire_uid() -> int:
+    """Take a uid no live submission of this process is using."""
+    with _uids_lock:
+        if not _free_uids:
+            raise ExecutionError("No free submission uid")
+        return _free_uids.popleft()
+
+def _release_uid(uid: int) -> None:
+    with _uids_lock:
+        _free_uids.append(uid)
+
+def _is_orphaned(owner: str) -> bool:
+    """Check whether the judge process named by a pool label is gone."""
+    host, _, rest = owner.partition(':')
+    pid, _, _ = rest.partition(':')
+    if owner == POOL_OWNER or host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return True  # An earlier process that had the same pid
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def reap_orphaned_pools() -> None:
+    """
+    Remove pool containers and volumes left behind by dead judge processes.
+
+    Pools are only closed at exit, so a gunicorn worker that is killed
+    leaks its containers. Meant to run in the background at startup; only
+    resources of this host whose owning process no longer exists are
+    removed, so other live workers keep theirs.
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        api = get_docker_client().api
+        containers = api.containers(all=True, filters={'label': POOL_LABEL})
+        volumes = api.volumes(filters={'label': POOL_LABEL}).get('Volumes') or []
+    except (docker.errors.DockerException, ExecutionError) as e:
+        logger.warning(f"Skipping orphaned pool cleanup: {str(e)}")
+        return
+
+    for container in containers:
+        if _is_orphaned(container['Labels'].get(POOL_LABEL, '')):
+            try:
+                api.remove_container(container['Id'], force=True)
+            except docker.errors.APIError as e:
+                logger.warning(f"Failed to remove orphaned container {container['Id']}: {str(e)}")
+
+    for volume in volumes:
+        if _is_orphaned((volume.get('Labels') or {}).get(POOL_LABEL, '')):
+            try:
+                api.remove_volume(volume['Name'], force=True)
+            except docker.errors.APIError as e:
+                logger.warning(f"Failed to remove orphaned volume {volume['Name']}: {str(e)}")
+
+def warm_up_images(images) -> None:
+    """
+    Pull the given images and run a no-op container from each one.
+
+    Meant to run in the background at startup, so the first submission for
+    a language neither waits on the registry nor reads a cold image from disk.
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        docker_client = get_docker_client()
+    except DockerConnectionError as e:
+        logger.warning(f"Skipping image warm-up: {str(e)}")
+        return
+
+    for image in images:
+        try:
+            docker_client.images.pull(image)
+            docker_client.containers.run(image, ['true'], remove=True, network_mode='none')
+            logger.info(f"Warmed up image {image}")
+        except docker.errors.DockerException as e:
+            logger.warning(f"Failed to warm up image {image}: {str(e)}")
+
+# Host CPUs no compile or run is using; each one holds a CPU of its own
+_free_cpus = set(range(os.cpu_count() or 1))
+_cpu_freed = threading.Condition()
+
+def _acquire_cpu(preferred=()) -> int:
+    """
+    Take a CPU no other compile or run is using, waiting until one is free.
+
+    Among the free CPUs, one of the preferred ones is picked if possible.
+    """
+    with _cpu_freed:
+        while not _free_cpus:
+            _cpu_freed.wait()
+        cpu = next((cpu for cpu in preferred if cpu in _free_cpus), min(_free_cpus))
+        _free_cpus.remove(cpu)
+        return cpu
+
+def _release_cpu(cpu: int) -> None:
+    with _cpu_freed:
+        _free_cpus.add(cpu)
+        _cpu_freed.notify()
+
+def _parse_maxrss(errors: bytes) -> Optional[int]:
+    """Read the peak memory in KB from the end of a run's stderr, if reported."""
+    marker = errors.rfind(MAXRSS_MARKER)
+    if marker < 0:
+        return None
+    try:
+        return int(errors[marker + len(MAXRSS_MARKER):].split()[0])
+    except (IndexError, ValueError):
+        return None
+
+class ContainerPool:
+    """
+    Pool of long-lived containers for one image and memory limit.
+
+    Containers are started once with ``sleep infinity`` and programs are run
+    inside them with ``exec``, so an execution no longer pays for creating,
+    starting and removing a container. All containers of a pool mount the
+    same Docker volume at /workspace; each submission works in its own
+    subdirectory of it, owned by the submission's uid with mode 0700, while
+    /workspace itself is 0711 so the other workspaces cannot be listed.
+    Files are uploaded with put_archive, so nothing is written to the
+    judge's own filesystem.
+
+    Programs run as unprivileged uids on a read-only root filesystem, and
+    a container is reset as root before it goes back to the pool: every
+    process but ``sleep`` (PID 1) is killed and /tmp is emptied. Killed
+    processes stay as zombies, as ``sleep`` never reaps them, so a container
+    in which anything was still running is discarded instead of reused.
+
+    Before its first container is handed out, the pool uploads the measuring
+    wrapper of its language into /workspace/.judge, building it there if
+    needed; runs go through it to report their own peak memory.
+
+    The pool hands out container IDs. Hot-path operations on them (exec,
+    kill, remove) go through the low-level API client, which talks to the
+    daemon directly. The high-level object model is used only to start
+    containers.
+
+    Every compile and run is pinned to a CPU that nothing else is using, and
+    waits for one when all are busy, so timings stay reproducible however
+    many containers exist. A container keeps its cpuset while idle, and
+    acquire() prefers one already pinned to the requested CPU, so the
+    cpuset rarely has to be updated.
+    """
+
+    def __init__(self, docker_client, image: str, memory_limit: int, measure: Dict[str, Any],
+                 size: int = CONTAINER_POOL_SIZE):
+        self.docker_client = docker_client
+        self.image = image
+        self.memory_limit = memory_limit
+        self.measure = measure
+        self.size = size
+        self.volume_name = docker_client.volumes.create(labels={POOL_LABEL: POOL_OWNER}).name
+        self.logger = logging.getLogger(__name__)
+        self._users = 0
+        self._last_used = time.monotonic()
+        self._idle = []
+        self._pinned = {}
+        self._oom_kills = {}
+        self._lock = threading.Lock()
+        self._measure_ready = False
+        self._measure_lock = threading.Lock()
+
+    def _start_container(self, cpu: int) -> str:
+        """Start a new container pinned to the given CPU and return its ID."""
+        container = self.docker_client.containers.run(
+            self.image,
+            ['sleep', 'infinity'],
+            volumes={self.volume_name: {'bind': '/workspace', 'mode': 'rw'}},
+            working_dir='/workspace',
+            read_only=True,
+            tmpfs={'/tmp': 'size=64m'},
+            init=False,  # Keep sleep as PID 1, out of reach of the reset
+            labels={POOL_LABEL: POOL_OWNER},
+            mem_limit=f'{self.memory_limit}m',
+            cpuset_cpus=str(cpu),
+            detach=True,
+            network_mode='none'  # Disable network access
+        )
+
+        try:
+            api = self.docker_client.api
+            exec_id = api.exec_create(container.id, ['chmod', '711', '/workspace'], user='root')['Id']
+            api.exec_start(exec_id)
+            self._install_measure(container.id)
+        except Exception:
+            container.remove(force=True)
+            raise
+
+        with self._lock:
+            self._pinned[container.id] = cpu
+            self._oom_kills[container.id] = 0
+        return container.id
+
+    def _helper_archive(self) -> bytes:
+        """Build an in-memory tar holding the helper directory and wrapper source."""
+        source = self.measure['source'].encode('utf-8')
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            directory = tarfile.TarInfo(os.path.basename(HELPER_DIR))
+            directory.type = tarfile.DIRTYPE
+            directory.mode = 0o755
+            tar.addfile(directory)
+
+            source_info = tarfile.TarInfo(f"{os.path.basename(HELPER_DIR)}/{self.measure['file']}")
+            source_info.size = len(source)
+            source_info.mode = 0o644
+            tar.addfile(source_info, io.BytesIO(source))
+        return buffer.getvalue()
+
+    def _install_measure(self, container_id: str) -> None:
+        """Upload and, if needed, build the measuring wrapper once per pool."""
+        with self._measure_lock:
+            if self._measure_ready:
+                return
+
+            api = self.docker_client.api
+            api.put_archive(container_id, '/workspace', self._helper_archive())
+            if self.measure['build_cmd']:
+                exec_id = api.exec_create(
+                    container_id,
+                    shlex.split(self.measure['build_cmd']),
+                    workdir=HELPER_DIR,
+                    user='root'
+                )['Id']
+                output = api.exec_start(exec_id)
+                if api.exec_inspect(exec_id)['ExitCode'] != 0:
+                    raise ExecutionError(
+                        f"Failed to build the measuring wrapper: {output.decode('utf-8', errors='replace')}"
+                    )
+            self._measure_ready = True
+
+    def attach(self) -> None:
+        """Register a submission using the pool; it is not evicted meanwhile."""
+        with self._lock:
+            self._users += 1
+
+    def detach(self) -> None:
+        """Unregister a submission once its workspace is removed."""
+        with self._lock:
+            self._users -= 1
+            self._last_used = time.monotonic()
+
+    def unused_for(self) -> float:
+        """Seconds since the last submission left the pool, 0 while one is using it."""
+        with self._lock:
+            return 0 if self._users else time.monotonic() - self._last_used
+
+    def idle_cpus(self) -> list:
+        """CPUs the idle containers are pinned to."""
+        with self._lock:
+            return [self._pinned[container_id] for container_id in self._idle]
+
+    def acquire(self, cpu: Optional[int] = None) -> str:
+        """
+        Take an idle container from the pool, starting one if none is left.
+
+        Args:
+            cpu: CPU to pin the container to, or None for any container
+                that is already running
+        """
+        with self._lock:
+            matching = [c for c in self._idle if cpu is None or self._pinned[c] == cpu]
+            container_id = (matching or self._idle or [None])[-1]
+            if container_id is not None:
+                self._idle.remove(container_id)
+                pinned = self._pinned[container_id]
+
+        if container_id is None:
+            return self._start_container(0 if cpu is None else cpu)
+
+        if cpu is not None and pinned != cpu:
+            try:
+                self.docker_client.api.update_container(container_id, cpuset_cpus=str(cpu))
+            except docker.errors.APIError:
+                self.discard(container_id)
+                raise
+            with self._lock:
+                self._pinned[container_id] = cpu
+        return container_id
+
+    def _record_oom_kills(self, container_id: str, output: bytes) -> bool:
+        """Store the OOM kill count printed by an exec; True if it went up."""
+        try:
+            count = int(output)
+        except ValueError:
+            return False
+
+        with self._lock:
+            previous = self._oom_kills.get(container_id, 0)
+            self._oom_kills[container_id] = count
+        return count > previous
+
+    def oom_killed(self, container_id: str) -> bool:
+        """Check whether the OOM killer struck in a container since the last check."""
+        api = self.docker_client.api
+        exec_id = api.exec_create(container_id, ['sh', '-c', OOM_KILLS_CMD], user='root')['Id']
+        return self._record_oom_kills(container_id, api.exec_start(exec_id))
+
+    def _reset(self, container_id: str) -> bool:
+        """Kill whatever the last user left behind; True if nothing was left."""
+        api = self.docker_client.api
+        try:
+            exec_id = api.exec_create(container_id, RESET_CMD, user='root')['Id']
+            # Also refreshes the OOM kill count, so kills that went unnoticed
+            # during the last run are not blamed on the next one
+            self._record_oom_kills(container_id, api.exec_start(exec_id))
+            return api.exec_inspect(exec_id)['ExitCode'] == 0
+        except docker.errors.APIError:
+            return False
+
+    def release(self, container_id: str) -> None:
+        """Reset a container and return it to the pool, or discard it if it is not clean."""
+        with self._lock:
+            full = len(self._idle) >= self.size
+        if full or not self._reset(container_id):
+            self.discard(container_id)
+            return
+
+        with self._lock:
+            self._idle.append(container_id)
+
+    def discard(self, container_id: str) -> None:
+        """Remove a container that must not be reused."""
+        with self._lock:
+            self._pinned.pop(container_id, None)
+            self._oom_kills.pop(container_id, None)
+
+        try:
+            self.docker_client.api.remove_container(container_id, force=True)
+        except docker.errors.APIError:
+            pass  # Ignore errors during cleanup
+
+    def close(self) -> None:
+        """Remove all idle containers and the shared workspace."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for container_id in idle:
+            self.discard(container_id)
+        try:
+            self.docker_client.api.remove_volume(self.volume_name, force=True)
+        except docker.errors.APIError:
+            pass  # Still in use by a busy container
+
+_pools: Dict[tuple, ContainerPool] = {}
+_pools_lock = threading.Lock()
+_pool_evictor = None
+
+def _evict_idle_pools() -> None:
+    """Close the pools no submission has used for POOL_IDLE_TIMEOUT seconds."""
+    while True:
+        time.sleep(POOL_IDLE_TIMEOUT / 4)
+        with _pools_lock:
+            idle = [key for key, pool in _pools.items() if pool.unused_for() >= POOL_IDLE_TIMEOUT]
+            evicted = [_pools.pop(key) for key in idle]
+        for pool in evicted:
+            pool.close()
+
+def get_container_pool(docker_client, image: str, memory_limit: int, measure: Dict[str, Any]) -> ContainerPool:
+    """
+    Return the process-wide container pool for an image and memory limit.
+
+    The measuring wrapper is only used when the pool is created; languages
+    sharing an image share its wrapper.
+
+    The caller is attached to the pool, which keeps it from being evicted,
+    and must call detach() once it no longer uses the pool.
+    """
+    global _pool_evictor
+    key = (image, memory_limit)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ContainerPool(docker_client, image, memory_limit, measure)
+        pool.attach()
+
+        if _pool_evictor is None:
+            _pool_evictor = threading.Thread(target=_evict_idle_pools, daemon=True)
+            _pool_evictor.start()
+        return pool
+
+@atexit.register
+def _close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
 class CodeExecutor:
     def __init__(self, language: str, source_code: str, time_limit: int, memory_limit: int):
         """
@@ -40,48 +615,22 @@ class CodeExecutor:
         self.memory_limit = memory_limit
         self.docker_client = None
         self.logger = logging.getLogger(__name__)
+        self._pool = None
+        self._workspace_name = None
+        self._uid = None
+        self._cancelled = threading.Event()
+        self._active = set()
+        self._active_lock = threading.Lock()
         
         self._initialize_docker()
         self.configure_language()
 
     def _initialize_docker(self) -> None:
-        """Initialize Docker client with error handling."""
-        try:
-            # Try to initialize Docker client without specifying a URL
-            self.docker_client = docker.from_env()
-            
-            # Test the connection
-            self.docker_client.ping()
-            self.logger.info("Successfully connected to Docker daemon")
-        
-        except docker.errors.DockerException as e:
-            self.logger.error(f"Failed to connect to Docker daemon: {str(e)}")
-            
-            # Try to initialize Docker client with a specific URL
-            try:
-                self.docker_client = docker.DockerClient(base_url="unix://var/run/docker.sock")
-                self.docker_client.ping()
-                self.logger.info("Successfully connected to Docker daemon using Unix socket")
-            except docker.errors.DockerException as e:
-                raise DockerConnectionError(f"Failed to connect to Docker daemon: {str(e)}")
+        """Use the process-wide Docker client."""
+        self.docker_client = get_docker_client()
 
     def configure_language(self) -> None:
         """Configure language-specific settings."""
-        LANGUAGE_CONFIGS = {
-            'python': {
-                'image': 'python:3.9-slim',
-                'extension': '.py',
-                'compile_cmd': None,
-                'run_cmd': 'python {filename}'
-            },
-            'cpp': {
-                'image': 'gcc:latest',
-                'extension': '.cpp',
-                'compile_cmd': 'g++ {filename} -o program',
-                'run_cmd': './program'
-            }
-        }
-
         self.language_config = LANGUAGE_CONFIGS.get(self.language)
         if not self.language_config:
             raise UnsupportedLanguageError(f"Unsupported language: {self.language}")
@@ -91,118 +640,344 @@ class CodeExecutor:
         self.compile_cmd = self.language_config['compile_cmd']
         self.run_cmd = self.language_config['run_cmd']
 
-    @contextmanager
-    def _prepare_workspace(self, test_input: str) -> str: # type: ignore
+        # The source file name never changes, so build the commands once
+        # instead of formatting them for every run
+        self._source_file = f"main{self.extension}"
+        # Every run goes through the measuring wrapper, which reports the
+        # program's peak memory
+        self._run_argv = (
+            shlex.split(self.language_config['measure']['cmd'])
+            + shlex.split(self.run_cmd.format(filename=self._source_file))
+        )
+        self._compile_argv = (
+            shlex.split(self.compile_cmd.format(filename=self._source_file))
+            if self.compile_cmd else None
+        )
+
+    def __enter__(self) -> 'CodeExecutor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def _user(self) -> str:
+        """User spec the submission's compiler and runs are exec'd as."""
+        return f"{self._uid}:{self._uid}"
+
+    @property
+    def _workdir(self) -> str:
+        """Workspace path as seen from inside the pooled containers."""
+        return f"/workspace/{self._workspace_name}"
+
+    def _workspace_archive(self) -> bytes:
+        """Build an in-memory tar holding the workspace directory and source file."""
+        source = self.source_code.encode('utf-8')
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            directory = tarfile.TarInfo(self._workspace_name)
+            directory.type = tarfile.DIRTYPE
+            directory.mode = 0o700
+            directory.uid = directory.gid = self._uid
+            tar.addfile(directory)
+
+            source_info = tarfile.TarInfo(f"{self._workspace_name}/{self._source_file}")
+            source_info.size = len(source)
+            source_info.mode = 0o600
+            source_info.uid = source_info.gid = self._uid
+            tar.addfile(source_info, io.BytesIO(source))
+        return buffer.getvalue()
+
+    def prepare(self) -> None:
         """
-        Prepare temporary workspace with source code and input files.
-        
-        Args:
-            test_input: Input data for the program
-            
-        Yields:
-            Path to temporary directory
+        Write the source code into a persistent workspace and compile it once.
+
+        The workspace is reused by every subsequent run() call, so compiled
+        languages are built once per submission instead of once per test case.
+
+        Raises:
+            CompilationError: If the source code does not compile
+            ExecutionError: If the workspace could not be set up
         """
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Write source code
-            source_file = f"main{self.extension}"
-            source_path = os.path.join(temp_dir, source_file)
-            with open(source_path, 'w') as f:
-                f.write(self.source_code)
+        if self._workspace_name is not None:
+            return
+
+        try:
+            self._pool = get_container_pool(
+                self.docker_client,
+                self.image,
+                self.memory_limit,
+                self.language_config['measure']
+            )
+            # Set first, so close() detaches from the pool whatever fails next
+            self._workspace_name = uuid.uuid4().hex
+            self._uid = _acquire_uid()
 
-            # Write input
-            input_path = os.path.join(temp_dir, 'input.txt')
-            with open(input_path, 'w') as f:
-                f.write(test_input)
+            cpu = _acquire_cpu(self._pool.idle_cpus())
+            try:
+                container_id = self._pool.acquire(cpu)
+            except Exception:
+                _release_cpu(cpu)
+                raise
 
-            yield temp_dir
+            compiled = False
+            try:
+                # The workspace lives on the pool's shared volume, so uploading it
+                # through one container makes it visible to all of them
+                self.docker_client.api.put_archive(container_id, '/workspace', self._workspace_archive())
+                self._compile_code(container_id, self._workdir)
+                compiled = True
+            finally:
+                # A failed build may have been killed at the time limit, so
+                # its container is replaced. The CPU is only handed on once
+                # the reset has killed anything the build left running
+                try:
+                    if compiled:
+                        self._pool.release(container_id)
+                    else:
+                        self._pool.discard(container_id)
+                finally:
+                    _release_cpu(cpu)
+
+        except (docker.errors.DockerException, OSError) as e:
+            raise ExecutionError(f"Failed to prepare workspace: {str(e)}") from e
 
-    def _compile_code(self, workspace_dir: str) -> None:
+    def _compile_code(self, container_id: str, workdir: str) -> None:
         """
         Compile the code if needed.
         
         Args:
-            workspace_dir: Path to temporary workspace
+            container_id: Pooled container to compile in
+            workdir: Workspace path inside the container
         """
-        if not self.compile_cmd:
+        if not self._compile_argv:
             return
 
+        api = self.docker_client.api
+        exec_id = api.exec_create(
+            container_id,
+            self._compile_argv,
+            workdir=workdir,
+            user=self._user
+        )['Id']
         try:
-            result = self.docker_client.containers.run(
-                self.image,
-                self.compile_cmd.format(filename=f"main{self.extension}"),
-                volumes={workspace_dir: {'bind': '/workspace', 'mode': 'rw'}},
-                working_dir='/workspace',
-                remove=True,
-                network_mode='none'  # Disable network access
-            )
-            self.logger.debug(f"Compilation result: {result}")
-        except docker.errors.ContainerError as e:
-            raise CompilationError(f"Compilation failed: {str(e)}")
+            with self._time_limit(container_id, COMPILE_TIME_LIMIT) as timed_out:
+                output = api.exec_start(exec_id)
+                exit_code = api.exec_inspect(exec_id)['ExitCode']
+        except Exception:
+            if not timed_out.is_set():
+                raise
+
+        if timed_out.is_set():
+            raise CompilationError(f"Compilation exceeded the time limit of {COMPILE_TIME_LIMIT}s")
+
+        self.logger.debug(f"Compilation result: {output}")
+        if exit_code != 0:
+            raise CompilationError(f"Compilation failed: {output.decode('utf-8', errors='replace')}")
 
-    def execute(self, test_input: str) -> Dict[str, Any]:
+    @contextmanager
+    def _time_limit(self, container_id: str, seconds: float):
         """
-        Execute the code with the given input.
-        
+        Kill a pooled container if the enclosed block outlasts the time limit.
+
+        Docker has no timeout for exec, so the whole container is killed
+        instead. Yields an event that is set once the container was killed.
+        """
+        api = self.docker_client.api
+        timed_out = threading.Event()
+
+        def kill() -> None:
+            timed_out.set()
+            try:
+                api.kill(container_id)
+            except docker.errors.APIError:
+                pass
+
+        timer = threading.Timer(seconds, kill)
+        timer.start()
+        try:
+            yield timed_out
+        finally:
+            timer.cancel()
+
+    @staticmethod
+    def _write_stdin(sock, data: bytes) -> None:
+        """Send the program's input and close its stdin."""
+        raw_sock = getattr(sock, '_sock', sock)
+        try:
+            raw_sock.sendall(data)
+            raw_sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass  # The program exited without reading all of its input
+
+    def _run_code(self, container_id: str, workdir: str, test_input: bytes) -> Dict[str, Any]:
+        """
+        Run the program inside a pooled container.
+
+        The input is piped to the program's stdin over the exec attach socket,
+        from a separate thread so that a program writing output before it has
+        read all of its input cannot deadlock. Docker has no timeout for exec,
+        so reading blocks until the program exits while a timer, started once
+        the program is running, kills the container at the time limit.
+
         Args:
+            container_id: Pooled container to run in
+            workdir: Workspace path inside the container
             test_input: Input data for the program
+
+        Returns:
+            Dictionary containing execution results; the output is the raw
+            stdout bytes, the execution time is the wall time in ms and the
+            memory used is the program's peak resident set size in KB, as
+            reported by the measuring wrapper, or None without a report
+        """
+        api = self.docker_client.api
+        exec_id = api.exec_create(
+            container_id,
+            self._run_argv,
+            stdin=True,
+            tty=False,  # Keep stdout and stderr apart and avoid CRLF rewriting
+            workdir=workdir,
+            user=self._user
+        )['Id']
+
+        sock = api.exec_start(exec_id, socket=True)
+        try:
+            with self._time_limit(container_id, self.time_limit) as timed_out:
+                started = time.monotonic()
+                threading.Thread(
+                    target=self._write_stdin,
+                    args=(sock, test_input),
+                    daemon=True
+                ).start()
+                output = bytearray()
+                errors = b''
+                for stream, data in frames_iter(sock, tty=False):
+                    # Only stdout is judged; of stderr only the end is kept,
+                    # where the measuring wrapper reports the peak memory
+                    if stream != STDOUT:
+                        errors = (errors + data)[-STDERR_TAIL_BYTES:]
+                        continue
+                    output += data
+                    if len(output) > MAX_OUTPUT_BYTES:
+                        raise OutputLimitExceededError(f"Output exceeded {MAX_OUTPUT_BYTES} bytes")
+                execution_time = time.monotonic() - started
+                exit_code = api.exec_inspect(exec_id)['ExitCode']
+        except OutputLimitExceededError:
+            raise
+        except Exception:
+            if not timed_out.is_set():
+                raise
+        finally:
+            sock.close()
+
+        if timed_out.is_set():
+            raise ExecutionTimeoutError(f"Time limit of {self.time_limit}s exceeded")
+
+        return {
+            'output': bytes(output),
+            'exit_code': exit_code,
+            'error': None,
+            'status': 'success',
+            'execution_time': round(execution_time * 1000),
+            'memory_used': _parse_maxrss(errors)
+        }
+
+    def run(self, test_input: Union[str, bytes]) -> Dict[str, Any]:
+        """
+        Run the prepared program with the given input.
+        
+        Args:
+            test_input: Input data for the program, as text or UTF-8 bytes
             
         Returns:
             Dictionary containing execution results
         """
         try:
-            with self._prepare_workspace(test_input) as workspace_dir:
-                if self.compile_cmd:
-                    self._compile_code(workspace_dir)
+            if self._workspace_name is None:
+                raise ExecutionError("prepare() must be called before run()")
+            if self._cancelled.is_set():
+                raise ExecutionCancelledError("Execution was cancelled")
 
-                container = None
-                try:
-                    # Run the code
-                    container = self.docker_client.containers.run(
-                        self.image,
-                        self.run_cmd.format(filename=f"main{self.extension}"),
-                        volumes={workspace_dir: {'bind': '/workspace', 'mode': 'rw'}},
-                        working_dir='/workspace',
-                        mem_limit=f'{self.memory_limit}m',
-                        cpus=1,
-                        detach=True,
-                        network_mode='none',  # Disable network access
-                        stdin_open=True,
-                        tty=True
-                    )
+            # Wait for a CPU of its own, so concurrent runs never share a core
+            cpu = _acquire_cpu(self._pool.idle_cpus())
+            try:
+                container_id = self._pool.acquire(cpu)
+            except Exception:
+                _release_cpu(cpu)
+                raise
 
-                    try:
-                        result = container.wait(timeout=self.time_limit)
-                        logs = container.logs().decode('utf-8', errors='replace')
-                        
-                        return {
-                            'output': logs,
-                            'exit_code': result['StatusCode'],
-                            'error': result.get('Error'),
-                            'status': 'success'
-                        }
-
-                    except docker.errors.NotFound:
-                        return {
-                            'output': None,
-                            'exit_code': 1,
-                            'error': 'Container was removed unexpectedly',
-                            'status': 'error'
-                        }
-
-                except docker.errors.ContainerError as e:
-                    return {
-                        'output': None,
-                        'exit_code': 1,
-                        'error': str(e),
-                        'status': 'error'
-                    }
-                
+            with self._active_lock:
+                self._active.add(container_id)
+            reusable = False
+            try:
+                # cancel() may have been called before the container was
+                # registered, or killed it while the program was running
+                if self._cancelled.is_set():
+                    raise ExecutionCancelledError("Execution was cancelled")
+                if isinstance(test_input, str):
+                    test_input = test_input.encode('utf-8')
+                result = self._run_code(container_id, self._workdir, test_input)
+                if self._cancelled.is_set():
+                    raise ExecutionCancelledError("Execution was cancelled")
+                # A failing program was only out of memory if the cgroup OOM
+                # killer fired during its run; exit code 137 alone may just
+                # as well be a program that killed itself
+                if result['exit_code'] != 0 and self._pool.oom_killed(container_id):
+                    result['status'] = 'memory_limit'
+                reusable = True
+                return result
+
+            except (docker.errors.DockerException, OSError):
+                if self._cancelled.is_set():
+                    raise ExecutionCancelledError("Execution was cancelled")
+                raise
+
+            finally:
+                with self._active_lock:
+                    self._active.discard(container_id)
+
+                # Killed or failed containers are replaced; finished ones are
+                # reset by release(), which also catches leftover processes.
+                # Until then those may still be busy on the CPU, so it is only
+                # handed on afterwards
+                try:
+                    if reusable:
+                        self._pool.release(container_id)
+                    else:
+                        self._pool.discard(container_id)
                 finally:
-                    if container:
-                        try:
-                            container.remove(force=True)
-                        except docker.errors.APIError:
-                            pass  # Ignore errors during cleanup
+                    _release_cpu(cpu)
+
+        except ExecutionTimeoutError as e:
+            return {
+                'output': None,
+                'exit_code': 1,
+                'error': str(e),
+                'status': 'timeout',
+                'execution_time': self.time_limit * 1000,
+                'memory_used': None
+            }
+
+        except ExecutionCancelledError as e:
+            return {
+                'output': None,
+                'exit_code': 1,
+                'error': str(e),
+                'status': 'skipped',
+                'execution_time': None,
+                'memory_used': None
+            }
+
+        except OutputLimitExceededError as e:
+            return {
+                'output': None,
+                'exit_code': 1,
+                'error': str(e),
+                'status': 'output_limit',
+                'execution_time': None,
+                'memory_used': None
+            }
 
         except Exception as e:
             self.logger.exception("Execution failed")
@@ -210,13 +985,73 @@ class CodeExecutor:
                 'output': None,
                 'exit_code': 1,
                 'error': str(e),
-                'status': 'error'
+                'status': 'error',
+                'execution_time': None,
+                'memory_used': None
             }
 
-    def cleanup(self) -> None:
-        """Cleanup resources."""
-        if self.docker_client:
+    def cancel(self) -> None:
+        """
+        Stop the runs in progress and skip any later run() calls.
+
+        The containers of running programs are killed; they are discarded
+        rather than returned to the pool once their run() call returns.
+        """
+        self._cancelled.set()
+        with self._active_lock:
+            active = list(self._active)
+
+        api = self.docker_client.api
+        for container_id in active:
+            try:
+                api.kill(container_id)
+            except docker.errors.APIError:
+                pass  # The program already finished
+
+    def close(self) -> None:
+        """
+        Remove the workspace created by prepare().
+
+        The removal takes an exec round trip, and possibly a container start
+        when the pool has no idle container left, so it runs on a background
+        thread instead of delaying the response.
+        """
+        if self._workspace_name is None:
+            return
+
+        workdir, uid = self._workdir, self._uid
+        self._workspace_name = self._uid = None
+        threading.Thread(
+            target=self._remove_workspace,
+            args=(workdir, uid),
+            daemon=True
+        ).start()
+
+    def _remove_workspace(self, workdir: str, uid: Optional[int]) -> None:
+        """Delete a workspace directory, then hand its uid out again."""
+        # The removal and the reset after it run on the container's CPU, so
+        # they hold it like a run does
+        cpu = _acquire_cpu(self._pool.idle_cpus())
+        try:
+            container_id = self._pool.acquire(cpu)
+        except (docker.errors.DockerException, OSError) as e:
+            self.logger.error(f"Failed to remove workspace {workdir}: {str(e)}")
+            _release_cpu(cpu)
+            self._pool.detach()
+            return
+
+        try:
+            api = self.docker_client.api
+            exec_id = api.exec_create(container_id, ['rm', '-rf', workdir], user='root')['Id']
+            api.exec_start(exec_id)
+            # Only hand the uid out again once nothing of it is left behind
+            if uid is not None:
+                _release_uid(uid)
+        except (docker.errors.DockerException, OSError) as e:
+            self.logger.error(f"Failed to remove workspace {workdir}: {str(e)}")
+        finally:
             try:
-                self.docker_client.close()
-            except Exception as e:
-                self.logger.error(f"Error during cleanup: {str(e)}")
\ No newline at end of file
+                self._pool.release(container_id)
+            finally:
+                _release_cpu(cpu)
+                self._pool.detach()
@@ -1,23 +1,90 @@
+import logging
+import threading
+
+import orjson
 import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "http://localhost:3000/api/v1"
 
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeout in seconds for backend requests
+REQUEST_TIMEOUT = (1, 5)
+
+# How long fetched problems and test cases are reused, in seconds
+CACHE_TTL = 60
+
+# Shared session so consecutive calls reuse keep-alive connections
+_session = requests.Session()
+_session.mount('http://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
+
+# Problems and test cases rarely change, so successful responses are kept
+# per problem for CACHE_TTL seconds. Cached values are shared between
+# requests and must not be mutated.
+_problem_cache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
+_test_cases_cache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
+_cache_lock = threading.Lock()
+
+def _cached(cache, problem_id):
+    with _cache_lock:
+        return cache.get(str(problem_id))
+
+def _store(cache, problem_id, value):
+    with _cache_lock:
+        cache[str(problem_id)] = value
+
+def invalidate_problem(problem_id):
+    """Drop the cached problem and test cases, e.g. after they were edited."""
+    with _cache_lock:
+        _problem_cache.pop(str(problem_id), None)
+        _test_cases_cache.pop(str(problem_id), None)
+
 def get_problem(problem_id):
+    problem = _cached(_problem_cache, problem_id)
+    if problem is not None:
+        return problem
+
     url = f"{BASE_URL}/problems/{problem_id}"
     try:
-        response = requests.get(url)
+        response = _session.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching problem with ID {problem_id}: {e}")
+        problem = orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        logger.warning("Error fetching problem with ID %s: %s", problem_id, e)
         return None
 
+    _store(_problem_cache, problem_id, problem)
+    return problem
+
 def get_test_cases(problem_id):
+    test_cases = _cached(_test_cases_cache, problem_id)
+    if test_cases is not None:
+        return test_cases
+
     url = f"{BASE_URL}/test-cases"
     try:
-        response = requests.get(url, params={"problemId": problem_id})
+        response = _session.get(url, params={"problemId": problem_id}, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching test cases for problem ID {problem_id}: {e}")
+        test_cases = orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        logger.warning("Error fetching test cases for problem ID %s: %s", problem_id, e)
         return None
+
+    # Inputs are sent to the programs as bytes; encode them once here
+    # rather than for every run of every submission
+    try:
+        for test_case in test_cases['data']:
+            test_case['input'] = test_case['input'].encode('utf-8')
+    except (KeyError, TypeError, AttributeError) as e:
+        logger.warning("Malformed test cases for problem ID %s: %s", problem_id, e)
+        return None
+
+    _store(_test_cases_cache, problem_id, test_cases)
+    return test_cases
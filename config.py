@@ -2,4 +2,12 @@ class Config:
     DOCKER_IMAGE_MAPPING = {
         'python': 'python:3.9-slim',
         'cpp': 'gcc:latest',
-    }
\ No newline at end of file
+    }
+    # Remove the pool containers and volumes of judge processes that died
+    # without cleaning up, in the background at startup
+    REAP_ORPHANED_POOLS = True
+    # Pull and warm up the images above in the background at startup
+    WARM_UP_IMAGES = True
+    # Stop judging a submission at its first failing test case; the remaining
+    # test cases are reported as SKIPPED
+    EARLY_EXIT = False
\ No newline at end of file
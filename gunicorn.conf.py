@@ -0,0 +1,11 @@
+import os
+
+bind = '0.0.0.0:5000'
+
+# Judging is I/O bound (Docker socket, backend API), so a single process
+# serves concurrent submissions from threads. Container pools, CPU pinning
+# and the problem cache live per process: extra workers get their own pools
+# and pin containers to the same CPUs, so raise the thread count first.
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))